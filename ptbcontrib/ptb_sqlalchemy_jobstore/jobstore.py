@@ -19,17 +19,45 @@
 """This file contains PTBSQLAlchemyJobStore."""
 
 import logging
-from typing import Any
-import telegram
+from collections.abc import Sequence
+from pickle import loads as _pickle_loads
+from typing import Any, Optional, Union
 from apscheduler.job import Job as APSJob
 
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from telegram.ext import CallbackContext, Dispatcher
+from telegram.ext import CallbackContext, Dispatcher, Job
 
 
 logger = logging.getLogger(__name__)
 
 
+class _LazyJobArgs(Sequence):
+    """
+    Args of a loaded job. The CallbackContext is only built on first access,
+    i.e. when the job is actually run, as many loaded jobs are never run.
+    Args:
+        tg_job (:class:`telegram.ext.Job`): The job to build the context for.
+        dispatcher (:class:`telegram.ext.Dispatcher`): The dispatcher to
+            build the context with.
+    """
+
+    __slots__ = ('tg_job', 'dispatcher', '_context')
+
+    def __init__(self, tg_job: Job, dispatcher: Dispatcher) -> None:
+        self.tg_job = tg_job
+        self.dispatcher = dispatcher
+        self._context: Optional[CallbackContext] = None
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        context = self._context
+        if context is None:
+            context = self._context = CallbackContext.from_job(self.tg_job, self.dispatcher)
+        return (context,)[index]
+
+    def __len__(self) -> int:
+        return 1
+
+
 class PTBSQLAlchemyJobStore(SQLAlchemyJobStore):
     """
     Wraps apscheduler.SQLAlchemyJobStore to make :class:`telegram.ext.Job` class storable.
@@ -84,16 +112,21 @@ class PTBSQLAlchemyJobStore(SQLAlchemyJobStore):
         # modifying actual job also modifies jobs in threadpool
         # executor which are currently running/going to run and
         # we'll get incorrect argument instead of CallbackContext.
-        prepped_job = APSJob.__new__(APSJob)
-        prepped_job.__setstate__(job.__getstate__())
+        state = job.__getstate__()
         # remove CallbackContext from job args since
         # it includes refrences to dispatcher which
         # is unpickleable. we'll recreate CallbackContext
         # in _reconstitute_job method.
-        if isinstance(job.args[0], CallbackContext):
+        if isinstance(job.args, _LazyJobArgs):
+            # no need to build the context just to throw it away
+            tg_job = job.args.tg_job
+            state['args'] = (tg_job.name, tg_job.context)
+        elif isinstance(job.args[0], CallbackContext):
             tg_job = job.args[0].job
             # APScheduler stores args as tuple.
-            prepped_job.args = (tg_job.name, tg_job.context)
+            state['args'] = (tg_job.name, tg_job.context)
+        prepped_job = APSJob.__new__(APSJob)
+        prepped_job.__setstate__(state)
         return prepped_job
 
     def _reconstitute_job(self, job_state: bytes) -> APSJob:
@@ -102,15 +135,23 @@ class PTBSQLAlchemyJobStore(SQLAlchemyJobStore):
         Args:
             job_state (:obj:`str`): String containing pickled job state.
         """
-        job = super()._reconstitute_job(job_state)  # pylint: disable=W0212
+        state = _pickle_loads(job_state)
 
         # Here we rebuild callback context for the job which
-        # are going for execution.
-        tg_job = telegram.ext.Job(
+        # are going for execution. We do this on the raw state rather
+        # than via job._modify, which would re-validate the callback
+        # signature for every single loaded job. The context itself
+        # is only built once the job is run.
+        tg_job = Job(
             callback=None,
-            name=job.args[0],
-            context=job.args[1],
+            name=state['args'][0],
+            context=state['args'][1],
         )
-        ctx = CallbackContext.from_job(tg_job, self.dispatcher)
-        job._modify(args=(ctx,))  # pylint: disable=W0212
+        state['args'] = _LazyJobArgs(tg_job, self.dispatcher)
+        state['jobstore'] = self
+
+        job = APSJob.__new__(APSJob)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler  # pylint: disable=W0212
+        job._jobstore_alias = self._alias  # pylint: disable=W0212
         return job
@@ -19,7 +19,8 @@
 """This module contains the class Role, which allows to restrict access to handlers."""
 import time
 from collections.abc import Mapping
-from threading import Lock, Event
+from copy import deepcopy
+from threading import Lock
 from typing import (
     ClassVar,
     Union,
@@ -31,6 +32,8 @@ from typing import (
     Iterator,
     NoReturn,
     Any,
+    cast,
+    Optional,
 )
 
 from telegram import ChatMember, TelegramError, Bot, Chat, Update
@@ -39,7 +42,7 @@ from telegram.ext import UpdateFilter
 _REPLACED_LOCK: str = 'ptbcontrib_roles_replaced_lock'
 
 
-class Role(UpdateFilter):
+class Role(UpdateFilter):  # pylint: disable=R0902
     """This class represents a security level used by :class:`telegram.ext.Roles`. Roles have a
     hierarchy, i.e. a role can do everthing, its child roles can do. To compare two roles you may
     use the following syntax::
@@ -121,8 +124,19 @@ class Role(UpdateFilter):
 
     _DEFAULT_ADMIN_NAME: ClassVar[str] = 'ptbcontrib_roles_default_admin'
     _admin_lock = Lock()
-    _admin_event = Event()
     _admin: ClassVar['Role'] = None  # type: ignore[assignment]
+    # Bumped on every change of members or child roles of *any* role. Since a roles effective
+    # members depend on its parents, caches derived from the hierarchy are tagged with this.
+    _version: ClassVar[int] = 0
+    _version_lock = Lock()
+    # Attributes that only cache derived data. They are neither pickled nor copied.
+    _CACHE_ATTRS: ClassVar[Tuple[str, ...]] = (
+        '_chat_ids_frozen',
+        '_child_roles_frozen',
+        '_effective_cache',
+        '_signature_cache',
+        '_descendants_cache',
+    )
 
     def __init__(
         self,
@@ -135,13 +149,18 @@ class Role(UpdateFilter):
         self.__lock = Lock()
 
         self._chat_ids = self._parse_chat_id(chat_ids)
+        self._chat_ids_frozen: Optional[Tuple[int, FrozenSet[int]]] = None
         self._child_roles: Set['Role'] = set()
+        self._child_roles_frozen: Optional[Tuple[int, FrozenSet['Role']]] = None
+        self._effective_cache: Optional[Tuple[int, FrozenSet[int], Tuple['Role', ...]]] = None
+        self._signature_cache: Optional[Tuple[int, Tuple[FrozenSet[int], FrozenSet, int]]] = None
+        self._descendants_cache: Optional[Tuple[int, FrozenSet['Role']]] = None
         self._set_child_roles(child_roles)
 
         # We need the if clause for the init of _admin
         if name != self._DEFAULT_ADMIN_NAME:
-            self.__init_admin()
-            self._admin_event.wait()
+            if Role._admin is None:
+                self.__init_admin()
             self._admin.add_child_role(self)
 
     @staticmethod
@@ -152,12 +171,18 @@ class Role(UpdateFilter):
             return {chat_id}
         return set(chat_id)
 
+    @staticmethod
+    def _bump_version() -> None:
+        with Role._version_lock:
+            Role._version += 1
+
     @staticmethod
     def __init_admin() -> None:
+        # Callers check Role._admin before calling this, so the lock is only acquired until the
+        # admin exists. It's assigned only once fully initialized, so there's nothing to wait for.
         with Role._admin_lock:
             if Role._admin is None:
                 Role._admin = Role(name=Role._DEFAULT_ADMIN_NAME)
-                Role._admin_event.set()
 
     def _set_custom_admin(self, new_admin: 'Role') -> None:
         with self._admin_lock:
@@ -179,12 +204,19 @@ class Role(UpdateFilter):
     ) -> None:
         with self.__lock:
             self._child_roles = self._parse_child_role(child_role)
+            self._child_roles_frozen = None
+        self._bump_version()
 
     @property
     def chat_ids(self) -> FrozenSet[int]:
         """Chat IDs of this role as frozenset (to ensure thread safety)."""
-        with self.__lock:
-            return frozenset(self._chat_ids)
+        # Cached just like child_roles
+        version = self._version
+        cache = self._chat_ids_frozen
+        if cache is None or cache[0] != version:
+            with self.__lock:
+                cache = self._chat_ids_frozen = (version, frozenset(self._chat_ids))
+        return cache[1]
 
     @property
     def child_roles(self) -> FrozenSet['Role']:
@@ -194,36 +226,103 @@ class Role(UpdateFilter):
         Returns:
             Set(:class:`telegram.ext.Role`):
         """
-        with self.__lock:
-            return frozenset(self._child_roles)
+        # The frozenset is cached until the hierarchy changes, so reading doesn't need the lock
+        version = self._version
+        cache = self._child_roles_frozen
+        if cache is None or cache[0] != version:
+            with self.__lock:
+                cache = self._child_roles_frozen = (version, frozenset(self._child_roles))
+        return cache[1]
 
     def __invert__(self) -> 'InvertedRole':
         return InvertedRole(self)
 
-    def filter(  # pylint: disable=W0221
+    def _descendants(self) -> FrozenSet['Role']:
+        """Collects the child roles of this role, their child roles and so on. The result is cached
+        until the role hierarchy changes.
+
+        Returns:
+            FrozenSet[:class:`Role`]
+        """
+        version = self._version
+        cache = self._descendants_cache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+
+        descendants = set()
+        queue = list(self.child_roles)
+        while queue:
+            role = queue.pop()
+            if role not in descendants:
+                descendants.add(role)
+                queue.extend(role.child_roles)
+
+        result = frozenset(descendants)
+        self._descendants_cache = (version, result)
+        return result
+
+    def _effective_members(self) -> Tuple[FrozenSet[int], Tuple['Role', ...]]:
+        """Collects the chat ids of this role and all its parent roles, i.e. all users/chats that
+        are allowed by this role. Parent roles with a custom ``filter`` method (e.g.
+        :class:`ChatAdminsRole`) can't be described by chat ids and are returned separately.
+        The result is cached until the role hierarchy changes.
+
+        Returns:
+            Tuple[FrozenSet[:obj:`int`], Tuple[:class:`Role`]]
+        """
+        version = self._version
+        cache = self._effective_cache
+        if cache is not None and cache[0] == version:
+            return cache[1], cache[2]
+
+        chat_ids = set(self.chat_ids)
+        custom_roles = []
+        # Walk down from the admin along all roles that are parents of this role
+        queue = [self._admin]
+        seen = {self._admin}
+        while queue:
+            role = queue.pop()
+            if role is not self and type(role).filter is not Role.filter:
+                custom_roles.append(role)
+                continue
+            chat_ids |= role.chat_ids
+            for child in role.child_roles:
+                if child not in seen and self <= child:
+                    seen.add(child)
+                    queue.append(child)
+
+        effective = (frozenset(chat_ids), tuple(custom_roles))
+        self._effective_cache = (version, *effective)
+        return effective
+
+    def filter(  # pylint: disable=W0221,R0911
         self,
         update: Update,
         target: 'Role' = None,
         inverted: bool = False,
     ) -> bool:
-        # Always allow admins
-        if self is not self._admin and self._admin.filter(update):
-            return True
-
         user = update.effective_user
         chat = update.effective_chat
+        # Chat ids are ints, so None is never contained in any of the sets below
+        user_id = user.id if user else None
+        chat_id = chat.id if chat else None
 
-        # If the update has neither effective chat nor user, we don't handle it
-        if not (user or chat):
-            return False
-
-        # First check if the user/chat is in the current roles allowed chats
-        if user and user.id in self.chat_ids:
-            return not inverted
-        if chat and chat.id in self.chat_ids:
-            return not inverted
+        # Membership tests on a set are atomic, so we can skip the chat_ids property here
+        chat_ids = self._chat_ids
 
         if inverted:
+            # Always allow admins
+            if self is not self._admin and self._admin.filter(update):
+                return True
+
+            # If the update has neither effective chat nor user, we don't handle it
+            if not (user or chat):
+                return False
+
+            # First check if the user/chat is in the current roles allowed chats
+            if user_id in chat_ids or chat_id in chat_ids:
+                return False
+
             # If this is an inverted role (i.e. ~role) and we arrived here, the user is
             # either
             # ... in a child role of this. In this case it must be excluded.
@@ -231,18 +330,25 @@ class Role(UpdateFilter):
             # dont want to exclude the parents (see below).
             return not any(child.filter(update, target=target) for child in self.child_roles)
 
-        # If we have no result here, we need to check the roles tree in order to check if
-        # a parent role allows us to handle the update
-        if target:
-            root = self
-        else:
-            # The initial call will start looking from the admin parent
-            root = self._admin
-            target = self
-        # We check all children that are parents of the target role
-        return any(
-            child.filter(update, target=target) for child in root.child_roles if target <= child
-        )
+        # Most updates come from members of this very role, so we check that before anything else
+        if user_id in chat_ids or chat_id in chat_ids:
+            return True
+
+        # If the update has neither effective chat nor user, we don't handle it
+        if not (user or chat):
+            return False
+
+        # Check if the user/chat is allowed by this role or one of its parents. The members of
+        # the admin are usually among them, so this is done before the admin check.
+        effective_ids, custom_roles = self._effective_members()
+        if user_id in effective_ids or chat_id in effective_ids:
+            return True
+
+        # Always allow admins
+        if self is not self._admin and self._admin.filter(update):
+            return True
+
+        return any(role.filter(update, target=self) for role in custom_roles)
 
     def add_member(self, chat_id: Union[int, List[int], Tuple[int, ...]]) -> None:
         """
@@ -255,6 +361,8 @@ class Role(UpdateFilter):
         """
         with self.__lock:
             self._chat_ids |= self._parse_chat_id(chat_id)
+            self._chat_ids_frozen = None
+        self._bump_version()
 
     def kick_member(self, chat_id: Union[int, List[int], Tuple[int, ...]]) -> None:
         """Kicks one ore more user(s)/chat(s) to from role. Will do nothing, if user/chat is not
@@ -265,6 +373,8 @@ class Role(UpdateFilter):
         """
         with self.__lock:
             self._chat_ids -= self._parse_chat_id(chat_id)
+            self._chat_ids_frozen = None
+        self._bump_version()
 
     def add_child_role(self, child_role: 'Role') -> None:
         """Adds a child role to this role. Will do nothing, if child role is already present.
@@ -277,7 +387,9 @@ class Role(UpdateFilter):
         if self <= child_role:
             raise ValueError('You must not add a parent role as a child!')
         with self.__lock:
-            self._child_roles |= {child_role}
+            self._child_roles.add(child_role)
+            self._child_roles_frozen = None
+        self._bump_version()
 
     def remove_child_role(self, child_role: 'Role') -> None:
         """Removes a child role from this role. Will do nothing, if child role is not present.
@@ -287,11 +399,14 @@ class Role(UpdateFilter):
         """
         with self.__lock:
             self._child_roles.discard(child_role)
+            self._child_roles_frozen = None
+        self._bump_version()
 
     def __lt__(self, other: object) -> bool:
         # Test for hierarchical order
         if isinstance(other, Role):
-            return self is not other and any(self <= child for child in other.child_roles)
+            # A role is never among its own descendants, as parents can't be added as children
+            return self in other._descendants()  # pylint: disable=W0212
         return False
 
     def __le__(self, other: object) -> bool:
@@ -301,7 +416,8 @@ class Role(UpdateFilter):
     def __gt__(self, other: object) -> bool:
         # Test for hierarchical order
         if isinstance(other, Role):
-            return self is not other and any(other <= child for child in self.child_roles)
+            # Not ``other < self``, as for subclasses Python would call our __gt__ again
+            return Role.__lt__(other, self)
         return False
 
     def __ge__(self, other: object) -> bool:
@@ -328,18 +444,25 @@ class Role(UpdateFilter):
         Returns:
             :obj:`bool`:
         """
-        if self.chat_ids == other.chat_ids:
-            if len(self.child_roles) == len(other.child_roles):
-                if len(self.child_roles) == 0:
-                    return True
-                for child_role in self.child_roles:
-                    if not any(child_role.equals(ocr) for ocr in other.child_roles):
-                        return False
-                for ocr in other.child_roles:
-                    if not any(ocr.equals(cr) for cr in self.child_roles):
-                        return False
-                return True
-        return False
+        return self._signature() == other._signature()  # pylint: disable=W0212
+
+    def _signature(self) -> Tuple[FrozenSet[int], FrozenSet, int]:
+        # Two roles are equal in terms of :meth:`equals`, if and only if their signatures are
+        # equal: The chat ids, the signatures of the child roles and the number of child roles
+        # must coincide. The signature is cached until the role hierarchy changes.
+        version = self._version
+        cache = self._signature_cache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+
+        child_roles = self.child_roles
+        signature = (
+            self.chat_ids,
+            frozenset(child._signature() for child in child_roles),  # pylint: disable=W0212
+            len(child_roles),
+        )
+        self._signature_cache = (version, signature)
+        return signature
 
     def __hash__(self) -> int:
         return id(self)
@@ -352,6 +475,14 @@ class Role(UpdateFilter):
             return f'Role({set(self.chat_ids)})'
         return 'Role({})'
 
+    def __setattr__(self, key: str, value: Any) -> None:
+        super().__setattr__(key, value)
+        # Helpers like BasePersistence.insert_bot replace the members or child roles by setting
+        # the attributes directly. As all caches are tagged with the version, none of them
+        # survives that, regardless of the order in which the attributes are set.
+        if key in ('_chat_ids', '_child_roles'):
+            self._bump_version()
+
     def __getstate__(self) -> Dict[str, Any]:
         """
         Gets called, when object is being pickled. Sets all variables ending on ``_lock`` to
@@ -362,6 +493,8 @@ class Role(UpdateFilter):
         for key, value in state.items():
             if isinstance(value, type(Lock())):
                 state[key] = _REPLACED_LOCK
+        for key in self._CACHE_ATTRS:
+            state[key] = None
         return state
 
     def __setstate__(self, state: Dict[str, Any]) -> None:
@@ -375,11 +508,61 @@ class Role(UpdateFilter):
             if isinstance(value, str) and value == _REPLACED_LOCK:
                 state[key] = Lock()
         self.__dict__.update(state)
+        self._clear_caches()
 
-        self.__init_admin()
-        self._admin_event.wait()
+        if Role._admin is None:
+            self.__init_admin()
         self._admin.add_child_role(self)
 
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'Role':
+        # Instead of having deepcopy recurse through the states of all child roles, we clone the
+        # hierarchy iteratively. Child roles that are shared by multiple parents are copied only
+        # once, as the copies are registered in memo.
+        new_role = self._copy_without_child_roles(memo)
+        new_roles = [new_role]
+        pending = [(self, new_role)]
+        while pending:
+            role, new_role = pending.pop()
+            for child in role.child_roles:
+                new_child = memo.get(id(child))
+                if new_child is None:
+                    new_child = child._copy_without_child_roles(memo)  # pylint: disable=W0212
+                    new_roles.append(new_child)
+                    pending.append((child, new_child))
+                new_role._child_roles.add(new_child)  # pylint: disable=W0212
+
+        # Just like unpickled roles, the copies are children of the admin
+        if Role._admin is None:
+            self.__init_admin()
+        for role in new_roles:
+            self._admin.add_child_role(role)
+        return new_roles[0]
+
+    def _copy_without_child_roles(self, memo: Dict[int, Any]) -> 'Role':
+        new_role = cast(Role, self.__class__.__new__(self.__class__))
+        memo[id(self)] = new_role
+        for key, value in self.__dict__.copy().items():
+            if key == '_chat_ids':
+                value = set(self.chat_ids)
+            elif key == '_child_roles':
+                value = set()
+            elif key in self._CACHE_ATTRS:
+                value = None
+            elif isinstance(value, type(Lock())):
+                value = Lock()
+            else:
+                value = deepcopy(value, memo)
+            new_role.__dict__[key] = value
+        new_role._clear_caches()  # pylint: disable=W0212
+        return new_role
+
+    def _clear_caches(self) -> None:
+        self._chat_ids_frozen = None
+        self._child_roles_frozen = None
+        self._effective_cache = None
+        self._signature_cache = None
+        self._descendants_cache = None
+
 
 class InvertedRole(UpdateFilter):
     """Represents a filter that has been inverted.
@@ -421,34 +604,42 @@ class ChatAdminsRole(Role):  # pylint: disable=R0901
     def __init__(self, bot: Bot, timeout: float = 1800):
         super().__init__(name='chat_admins')
         self.bot = bot
-        self.cache: Dict[int, Tuple[float, List[int]]] = {}
+        self.cache: Dict[int, Tuple[float, FrozenSet[int]]] = {}
         self.timeout = timeout
 
     def __invert__(self) -> NoReturn:
         raise RuntimeError('Instances of ChatAdminsRole can not be inverted')
 
+    def _copy_without_child_roles(self, memo: Dict[int, Any]) -> 'Role':
+        # The bot can't be deep copied, so the copy shares it. The cached values are immutable,
+        # so copying the dict is enough. Registering both in memo keeps deepcopy from recursing.
+        memo[id(self.bot)] = self.bot
+        memo[id(self.cache)] = self.cache.copy()
+        return super()._copy_without_child_roles(memo)
+
     def filter(self, update: Update, target: Role = None, inverted: bool = False) -> bool:
+        user = update.effective_user
+        chat = update.effective_chat
+
+        # Always true in private chats
+        if user and chat and chat.type == Chat.PRIVATE:
+            return True
+
         # Always allow admins
         if self is not self._admin and self._admin.filter(update):
             return True
 
-        user = update.effective_user
-        chat = update.effective_chat
-
         if user and chat:
-            # Always true in private chats
-            if chat.type == Chat.PRIVATE:
-                return True
-
-            # Check for cached info first
-            if (
-                self.cache.get(chat.id, None)
-                and (time.time() - self.cache[chat.id][0]) < self.timeout
-            ):
-                return user.id in self.cache[chat.id][1]
-
-            admins = [m.user.id for m in self.bot.get_chat_administrators(chat.id)]
-            self.cache[chat.id] = (time.time(), admins)
+            # Check for cached info first. The cache is persisted along with the roles, so we need
+            # the wall clock here. Entries from the future, e.g. after the system clock was set
+            # back, are refreshed as well.
+            entry = self.cache.get(chat.id)
+            now = time.time()
+            if entry and 0 <= now - entry[0] < self.timeout:
+                return user.id in entry[1]
+
+            admins = frozenset(m.user.id for m in self.bot.get_chat_administrators(chat.id))
+            self.cache[chat.id] = (now, admins)
             return user.id in admins
         return False
 
@@ -472,24 +663,32 @@ class ChatCreatorRole(Role):  # pylint: disable=R0901
     def __invert__(self) -> NoReturn:
         raise RuntimeError('Instances of ChatCreatorRole can not be inverted')
 
+    def _copy_without_child_roles(self, memo: Dict[int, Any]) -> 'Role':
+        # The bot can't be deep copied, so the copy shares it. The cached values are immutable,
+        # so copying the dict is enough. Registering both in memo keeps deepcopy from recursing.
+        memo[id(self.bot)] = self.bot
+        memo[id(self.cache)] = self.cache.copy()
+        return super()._copy_without_child_roles(memo)
+
     def filter(  # pylint: disable=R0911
         self, update: Update, target: Role = None, inverted: bool = False
     ) -> bool:
+        user = update.effective_user
+        chat = update.effective_chat
+
+        # Always true in private chats
+        if user and chat and chat.type == Chat.PRIVATE:
+            return True
+
         # Always allow admins
         if self is not self._admin and self._admin.filter(update):
             return True
 
-        user = update.effective_user
-        chat = update.effective_chat
-
         if user and chat:
-            # Always true in private chats
-            if chat.type == Chat.PRIVATE:
-                return True
-
             # Check for cached info first
-            if self.cache.get(chat.id, None):
-                return user.id == self.cache[chat.id]
+            creator_id = self.cache.get(chat.id)
+            if creator_id:
+                return user.id == creator_id
             try:
                 member = self.bot.get_chat_member(chat.id, user.id)
                 if member.status == ChatMember.CREATOR:
@@ -531,6 +730,9 @@ class Roles(Mapping):
         super().__init__()
         self.__lock = Lock()
         self.__roles: Dict[str, Role] = {}
+        self._index_cache: Optional[
+            Tuple[int, Dict[str, Role], Tuple[Role, ...], Dict[int, List[int]], Tuple[int, ...]]
+        ] = None
         self.bot = bot
 
         self.admins = Role(name='admins')
@@ -555,16 +757,67 @@ class Roles(Mapping):
             raise ValueError('Bot is already set for this Roles instance')
         self.bot = bot
 
+    # The roles dict is never changed in place, but replaced on every change. This way reading
+    # doesn't need the lock.
     def __getitem__(self, item: str) -> Role:
-        with self.__lock:
-            return self.__roles[item]
+        return self.__roles[item]
 
     def __iter__(self) -> Iterator[str]:
         return iter(self.__roles)
 
     def __len__(self) -> int:
-        with self.__lock:
-            return len(self.__roles)
+        return len(self.__roles)
+
+    def _index(self) -> Tuple[Tuple[Role, ...], Dict[int, List[int]], Tuple[int, ...]]:
+        # Maps each chat id to the positions of the roles that allow it, including the ids of
+        # their parents. Roles with parents that can't be described by chat ids (e.g. if
+        # chat_admins is a parent) are listed separately. The index is rebuilt if the role
+        # hierarchy or the roles of this instance changed.
+        version = Role._version  # pylint: disable=W0212
+        roles_dict = self.__roles
+        cache = self._index_cache
+        if cache is not None and cache[0] == version and cache[1] is roles_dict:
+            return cache[2], cache[3], cache[4]
+
+        roles = tuple(roles_dict.values())
+        index: Dict[int, List[int]] = {}
+        custom = []
+        for position, role in enumerate(roles):
+            chat_ids, custom_roles = role._effective_members()  # pylint: disable=W0212
+            for chat_id in chat_ids:
+                index.setdefault(chat_id, []).append(position)
+            if custom_roles:
+                custom.append(position)
+
+        self._index_cache = (version, roles_dict, roles, index, tuple(custom))
+        return roles, index, tuple(custom)
+
+    def roles_for(self, update: Update) -> List[Role]:
+        """Returns all roles of this instance that allow the given update, i.e. all roles for
+        which ``role(update)`` would be :obj:`True`. This is faster than checking each role
+        separately, as the roles are looked up by the ids of the effective user and chat.
+
+        Args:
+            update (:class:`telegram.Update`): The update.
+
+        Returns:
+            List[:class:`telegram.ext.Role`]: The roles in the order they were added.
+        """
+        user = update.effective_user
+        chat = update.effective_chat
+        if not (user or chat):
+            return []
+
+        roles, index, custom = self._index()
+        positions: Set[int] = set()
+        if user:
+            positions.update(index.get(user.id, ()))
+        if chat:
+            positions.update(index.get(chat.id, ()))
+        for position in custom:
+            if position not in positions and roles[position].filter(update):
+                positions.add(position)
+        return [roles[position] for position in sorted(positions)]
 
     def add_admin(self, chat_id: Union[int, List[int], Tuple[int, ...]]) -> None:
         """Adds a user/chat to the :attr:`admins` role. Will do nothing if user/chat is already
@@ -609,7 +862,9 @@ class Roles(Mapping):
         role = Role(chat_ids=chat_ids, child_roles=child_roles, name=name)
         role._set_custom_admin(self.admins)  # pylint: disable=W0212
         with self.__lock:
-            self.__roles[name] = role
+            roles = self.__roles.copy()
+            roles[name] = role
+            self.__roles = roles
 
     def remove_role(self, name: str) -> Role:
         """Removes a role.
@@ -621,7 +876,9 @@ class Roles(Mapping):
             The removed role.
         """
         with self.__lock:
-            role = self.__roles.pop(name)
+            roles = self.__roles.copy()
+            role = roles.pop(name)
+            self.__roles = roles
         self.admins.remove_child_role(role)
         Role._admin.add_child_role(role)  # pylint: disable=W0212
         return role
@@ -636,6 +893,8 @@ class Roles(Mapping):
         for key, value in state.items():
             if isinstance(value, type(Lock())):
                 state[key] = _REPLACED_LOCK
+        # The index is rebuilt on demand
+        state.pop('_index_cache', None)
         return state
 
     def __setstate__(self, state: Dict[str, Any]) -> None:
@@ -649,6 +908,7 @@ class Roles(Mapping):
             if isinstance(value, str) and value == _REPLACED_LOCK:
                 state[key] = Lock()
         self.__dict__.update(state)
+        self._index_cache = None
 
         for role in self.values():
             role._set_custom_admin(self.admins)
@@ -24,6 +24,7 @@ import platform
 import datetime as dtm
 import pytest
 
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
 from telegram.ext import JobQueue, CallbackContext
 
 subprocess.check_call(
@@ -63,6 +64,10 @@ def dummy_job(ctx):
         pytest.fail()
 
 
+def context_job(ctx):
+    return ctx
+
+
 @pytest.mark.skipif(
     os.getenv('GITHUB_ACTIONS', False) and platform.system() in ['Windows', 'Darwin'],
     reason="On Windows & MacOS precise timings are not accurate.",
@@ -106,3 +111,50 @@ class TestPTBJobstore:
         with caplog.at_level(logging.WARNING):
             PTBSQLAlchemyJobStore(cdp, url="sqlite:///:memory:")
         assert "Use of SQLite db is not supported" in caplog.text
+
+    def test_reconstitute_job_context(self, jq, jobstore, cdp):
+        initial_job = jq.run_once(dummy_job, 1, context={'foo': 'bar'}, name='my_job')
+        job = jobstore.lookup_job(initial_job.id)
+        assert len(job.args) == 1
+        assert job.args._context is None
+        (ctx,) = job.args
+        assert job.args[0] is ctx
+        assert isinstance(ctx, CallbackContext)
+        assert ctx.dispatcher is cdp
+        assert ctx.job.name == 'my_job'
+        assert ctx.job.context == {'foo': 'bar'}
+        assert job._jobstore_alias == 'default'
+
+    def test_run_reconstituted_job(self, jq, jobstore):
+        initial_job = jq.run_once(context_job, 10, context='foo', name='my_job')
+        job = jobstore.lookup_job(initial_job.id)
+        # this is how apscheduler calls the job
+        ctx = job.func(*job.args, **job.kwargs)
+        assert ctx.job.name == 'my_job'
+        assert ctx.job.context == 'foo'
+        assert jq.jobs()[0].context == 'foo'
+
+    def test_update_reconstituted_job(self, jq, jobstore):
+        initial_job = jq.run_once(dummy_job, 10, context='foo', name='my_job')
+        job = jobstore.lookup_job(initial_job.id)
+        jobstore.update_job(job)
+        assert job.args._context is None
+        assert jobstore.lookup_job(initial_job.id).args[0].job.context == 'foo'
+
+    def test_add_existing_job(self, jq, jobstore):
+        initial_job = jq.run_once(dummy_job, 1)
+        with pytest.raises(ConflictingIdError):
+            jobstore.add_job(initial_job.job)
+
+    def test_update_job(self, jq, jobstore):
+        initial_job = jq.run_once(dummy_job, 1, context='foo')
+        initial_job.job.args[0].job.context = 'bar'
+        jobstore.update_job(initial_job.job)
+        job = jobstore.lookup_job(initial_job.id)
+        assert job.args[0].job.context == 'bar'
+        # the running job must not be modified by persisting it
+        assert isinstance(initial_job.job.args[0], CallbackContext)
+
+        jobstore.remove_job(initial_job.id)
+        with pytest.raises(JobLookupError):
+            jobstore.update_job(initial_job.job)
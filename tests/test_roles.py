@@ -183,6 +183,7 @@ class TestRole:
         assert role.child_roles == {parent_role}
         role.add_child_role(parent2)
         assert role.child_roles == {parent_role, parent2}
+        assert role.child_roles is role.child_roles
 
         role.remove_child_role(parent_role)
         assert role.child_roles == {parent2}
@@ -230,6 +231,12 @@ class TestRole:
         r2.add_member(1)
         assert role.equals(parent_role)
 
+        # Equal child roles must still be matched in number
+        role.add_child_role(Role(chat_ids=1))
+        assert not role.equals(parent_role)
+        parent_role.add_child_role(Role(chat_ids=1))
+        assert role.equals(parent_role)
+
     def test_comparison(self, role, parent_role):
         assert not role <= 1
         assert not role >= 1
@@ -251,6 +258,17 @@ class TestRole:
         assert not role < parent_role
         assert not parent_role < role
 
+        grandparent = Role(name='grandparent', child_roles=parent_role)
+        parent_role.add_child_role(role)
+        assert role < grandparent
+        assert grandparent > role
+        assert grandparent._descendants() == {parent_role, role}
+        assert role._descendants() == frozenset()
+        parent_role.remove_child_role(role)
+        assert not role < grandparent
+        assert not grandparent > role
+        assert grandparent._descendants() == {parent_role}
+
     def test_hash(self, role, parent_role):
         assert role != parent_role
         assert hash(role) != hash(parent_role)
@@ -261,6 +279,10 @@ class TestRole:
         assert parent_role == parent_role
         assert hash(parent_role) == hash(parent_role)
 
+        copied_role = deepcopy(role)
+        assert hash(copied_role) != hash(role)
+        assert hash(copied_role) == hash(copied_role)
+
     def test_deepcopy(self, role, parent_role):
         child = Role(name='cr', chat_ids=[1, 2, 3])
         role.add_child_role(child)
@@ -275,6 +297,22 @@ class TestRole:
         assert child is not copied_child
         assert child.equals(copied_child)
 
+    def test_deepcopy_shared_child(self, role, parent_role):
+        child = Role(name='cr', chat_ids=[1, 2, 3])
+        role.add_child_role(parent_role)
+        role.add_child_role(child)
+        parent_role.add_child_role(child)
+        copied_role = deepcopy(role)
+
+        assert role.equals(copied_role)
+        copied_parent = next(r for r in copied_role.child_roles if r.child_roles)
+        (copied_child,) = copied_parent.child_roles
+        assert copied_child in copied_role.child_roles
+        assert copied_child is not child
+        assert copied_child < copied_parent < copied_role
+        assert copied_role in Role._admin.child_roles
+        assert copied_child in Role._admin.child_roles
+
     def test_filter_user(self, update, role, parent_role):
         update.message.chat = None
         assert not role(update)
@@ -303,6 +341,43 @@ class TestRole:
         parent_role.add_member(1)
         assert role(update)
 
+    def test_filter_member_skips_tree(self, update, role, monkeypatch):
+        def fail(*args, **kwargs):
+            pytest.fail('The role tree should not be checked for members of the role')
+
+        role.add_member(0)
+        monkeypatch.setattr(role._admin, 'filter', fail)
+        monkeypatch.setattr(role, '_effective_members', fail)
+        assert role(update)
+
+    def test_filter_grandparent(self, update, role, parent_role):
+        update.message.from_user.id = 1
+        update.message.chat.id = 1
+        grandparent = Role(name='grandparent')
+        parent_role.add_child_role(role)
+        grandparent.add_child_role(parent_role)
+        assert not role(update)
+
+        grandparent.add_member(1)
+        assert role(update)
+        assert parent_role(update)
+        grandparent.remove_child_role(parent_role)
+        assert not role(update)
+
+    def test_filter_custom_parent(self, update, role, chat_admins_role, monkeypatch):
+        def admins(*args, **kwargs):
+            return [ChatMember(User(1, 'TestUser1', False), 'administrator')]
+
+        monkeypatch.setattr(chat_admins_role.bot, 'get_chat_administrators', admins)
+        update.message.chat.type = Chat.GROUP
+        update.message.from_user.id = 1
+        assert not role(update)
+
+        chat_admins_role.add_child_role(role)
+        assert role(update)
+        update.message.from_user.id = 2
+        assert not role(update)
+
     def test_filter_merged_roles(self, update, role):
         role.add_member(0)
         r = Role(0)
@@ -388,6 +463,19 @@ class TestRole:
         assert data['child'] <= data['parent']
         assert not data['role'] <= data['parent']
 
+    @pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+    def test_pickle_protocols(self, role, parent_role, protocol):
+        role.add_member(0)
+        parent_role.add_child_role(role)
+
+        new_parent = pickle.loads(pickle.dumps(parent_role, protocol))
+        assert new_parent.equals(parent_role)
+        assert hash(new_parent) == hash(new_parent)
+        assert hash(new_parent) != hash(parent_role)
+        (new_role,) = new_parent.child_roles
+        assert new_role < new_parent
+        assert new_role.chat_ids == {0}
+
 
 class TestChatAdminsRole:
     def test_creation(self, bot):
@@ -461,7 +549,7 @@ class TestChatAdminsRole:
         assert not chat_admins_role(update)
         assert isinstance(chat_admins_role.cache[0], tuple)
         assert pytest.approx(chat_admins_role.cache[0][0]) == time.time()
-        assert chat_admins_role.cache[0][1] == [0, 1]
+        assert chat_admins_role.cache[0][1] == frozenset([0, 1])
 
         def admins(*args, **kwargs):
             raise ValueError('This method should not be called!')
@@ -482,7 +570,24 @@ class TestChatAdminsRole:
         assert chat_admins_role(update)
         assert isinstance(chat_admins_role.cache[0], tuple)
         assert pytest.approx(chat_admins_role.cache[0][0]) == time.time()
-        assert chat_admins_role.cache[0][1] == [2]
+        assert chat_admins_role.cache[0][1] == frozenset([2])
+
+        # Entries from the future are refreshed
+        chat_admins_role.cache[0] = (time.time() + 100, frozenset([1]))
+        update.message.from_user.id = 1
+        assert not chat_admins_role(update)
+        assert chat_admins_role.cache[0][1] == frozenset([2])
+
+    def test_deepcopy(self, chat_admins_role):
+        chat_admins_role.cache[0] = (time.time(), frozenset([1]))
+        copied_role = deepcopy(chat_admins_role)
+        assert copied_role is not chat_admins_role
+        assert isinstance(copied_role, ChatAdminsRole)
+        assert copied_role.bot is chat_admins_role.bot
+        assert copied_role.timeout == chat_admins_role.timeout
+        assert copied_role.cache == chat_admins_role.cache
+        assert copied_role.cache is not chat_admins_role.cache
+        assert copied_role in copied_role._admin.child_roles
 
     def test_no_invert(self, chat_admins_role):
         with pytest.raises(RuntimeError, match='can not be inverted'):
@@ -576,6 +681,16 @@ class TestChatCreatorRole:
         update.message.from_user.id = 2
         assert not chat_creator_role(update)
 
+    def test_deepcopy(self, chat_creator_role):
+        chat_creator_role.cache[0] = 1
+        copied_role = deepcopy(chat_creator_role)
+        assert copied_role is not chat_creator_role
+        assert isinstance(copied_role, ChatCreatorRole)
+        assert copied_role.bot is chat_creator_role.bot
+        assert copied_role.cache == {0: 1}
+        assert copied_role.cache is not chat_creator_role.cache
+        assert copied_role in copied_role._admin.child_roles
+
     def test_no_invert(self, chat_creator_role):
         with pytest.raises(RuntimeError, match='can not be inverted'):
             ~chat_creator_role
@@ -633,6 +748,15 @@ class TestRoles:
         d = [r.chat_ids for r in roles.values()]
         assert d == [set([k]) for k in range(3)]
 
+    def test_change_while_iterating(self, roles):
+        roles.add_role('role0', 0)
+        for name in roles:
+            roles.add_role(f'{name}_new')
+        assert set(roles) == {'role0', 'role0_new'}
+        for name in roles:
+            roles.remove_role(name)
+        assert len(roles) == 0
+
     def test_add_remove_role(self, roles, parent_role):
         roles.add_role('role', child_roles=[parent_role])
         role = roles['role']
@@ -650,6 +774,43 @@ class TestRoles:
         assert not role <= roles.admins
         assert role in Role._admin.child_roles
 
+    def test_roles_for(self, roles, update):
+        roles.add_role('role_1', 0)
+        roles.add_role('role_2', 1)
+        roles.add_role('role_3', [0, 1])
+        assert roles.roles_for(update) == [roles['role_1'], roles['role_3']]
+
+        update.message.from_user.id = 1
+        assert roles.roles_for(update) == [roles['role_1'], roles['role_2'], roles['role_3']]
+
+        update.message.chat.id = 2
+        update.message.from_user.id = 2
+        assert roles.roles_for(update) == []
+        roles['role_2'].add_child_role(roles['role_1'])
+        roles['role_2'].add_member(2)
+        assert roles.roles_for(update) == [roles['role_1'], roles['role_2']]
+        roles.add_admin(2)
+        assert roles.roles_for(update) == [roles['role_1'], roles['role_2'], roles['role_3']]
+        roles.remove_role('role_2')
+        assert roles.roles_for(update) == [roles['role_1'], roles['role_3']]
+
+        assert roles.roles_for(Update(1)) == []
+
+    def test_roles_for_custom_parent(self, roles, update, monkeypatch):
+        def admins(*args, **kwargs):
+            return [ChatMember(User(1, 'TestUser1', False), 'administrator')]
+
+        monkeypatch.setattr(roles.chat_admins.bot, 'get_chat_administrators', admins)
+        update.message.chat.type = Chat.GROUP
+        update.message.chat.id = 5
+        roles.add_role('role_1', 0)
+        roles.add_role('role_2')
+        roles.chat_admins.add_child_role(roles['role_2'])
+
+        assert roles.roles_for(update) == [roles['role_1']]
+        update.message.from_user.id = 1
+        assert roles.roles_for(update) == [roles['role_2']]
+
     def test_handler_admins(self, roles, update):
         roles.add_role('role', 0)
         roles.add_admin(1)